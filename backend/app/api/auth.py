@@ -1,16 +1,40 @@
+import os
+import time
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from app.db.database import get_db, engine
-from app.db import models
-from app.core.security import verify_password, get_password_hash, create_access_token
+from jose import JWTError
+from app.core.cache import TTLCache
+from app.db.database import get_db, SessionLocal
+from app.db import models, crud
+from app.core.security import (
+    create_access_token, decode_access_token, verify_password_async, get_password_hash_async,
+    PasswordHashBusy, auth_rate_limiter, SECRET_KEY, DEFAULT_SECRET_KEY,
+)
 from pydantic import BaseModel
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+# Set AUTH_ENABLED=true to require a bearer token on every /api route
+AUTH_ENABLED = os.getenv("AUTH_ENABLED", "false").lower() in ("1", "true", "yes")
+
+def check_auth_config(auth_enabled: bool, secret_key: str):
+    """
+    Refuse to start with auth on but tokens signed by the public default key.
+    """
+    if auth_enabled and secret_key == DEFAULT_SECRET_KEY:
+        raise RuntimeError("AUTH_ENABLED is set but SECRET_KEY is not; set SECRET_KEY to a long random value")
+
+check_auth_config(AUTH_ENABLED, SECRET_KEY)
 
 router = APIRouter()
 
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+# Decoded claims by raw token, so repeat requests skip the signature check
+_claims_cache = TTLCache(maxsize=10000, ttl=300)
+# Minimal user rows by email, so repeat requests skip the database
+_user_cache = TTLCache(maxsize=10000, ttl=300)
+
 class UserCreate(BaseModel):
     email: str
     password: str
@@ -19,25 +43,88 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class CurrentUser(BaseModel):
+    id: int
+    email: str
+
+_credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    """
+    Resolves the bearer token to a user. On the hot path this is two in-memory cache lookups:
+    the JWT is only decoded, and the user only loaded from the database, on a cache miss.
+    """
+    if not token:
+        raise _credentials_exception
+
+    claims = _claims_cache.get(token)
+    if claims is None:
+        try:
+            claims = decode_access_token(token)
+        except JWTError:
+            raise _credentials_exception
+        # Never cache a token past its own expiry
+        _claims_cache.set(token, claims, ttl=min(_claims_cache.ttl, claims["exp"] - time.time()))
+    elif claims["exp"] <= time.time():
+        _claims_cache.pop(token)
+        raise _credentials_exception
+
+    email = claims.get("sub")
+    if not email:
+        raise _credentials_exception
+
+    user = _user_cache.get(email)
+    if user is None:
+        async with SessionLocal() as db:
+            db_user = await crud.get_user_by_email(db, email)
+        if db_user is None:
+            raise _credentials_exception
+        user = CurrentUser(id=db_user.id, email=db_user.email)
+        _user_cache.set(email, user)
+    return user
+
+def _check_rate_limit(account: str):
+    # Keyed on the account, not the client address: behind a load balancer every user shares
+    # one address, and per-account limits are what stops password guessing anyway
+    if not auth_rate_limiter.allow(account.strip().lower()):
+        raise HTTPException(status_code=429, detail="Too many attempts, please try again later")
+
 @router.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    _check_rate_limit(user.email)
+    db_user = await crud.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    hashed_password = get_password_hash(user.password)
+
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except PasswordHashBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please try again shortly")
     new_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Someone registered the same email between our check and the insert
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
+
     access_token = create_access_token(data={"sub": new_user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    _check_rate_limit(form_data.username)
+    user = await crud.get_user_by_email(db, form_data.username)
+    try:
+        valid = user is not None and await verify_password_async(form_data.password, user.hashed_password)
+    except PasswordHashBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please try again shortly")
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -45,3 +132,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         )
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/me", response_model=CurrentUser)
+async def read_current_user(user: CurrentUser = Depends(get_current_user)):
+    return user
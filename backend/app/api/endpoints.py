@@ -1,39 +1,86 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.core.rag import process_pdf, query_documents, generate_insights, compare_documents, generate_answer
-from app.db.database import get_db
-from app.db.models import Document
 from datetime import datetime
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.core.rag import (
+    process_pdf, query_page, generate_insights, compare_documents, compare_many, generate_answer,
+    delete_document_chunks, build_document_profile,
+)
+from app.db.database import get_db
+from app.db import crud
 
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
     try:
-        message = await process_pdf(file)
-        
-        # Add to DB if not exists
-        existing_doc = db.query(Document).filter(Document.filename == file.filename).first()
-        if not existing_doc:
-            new_doc = Document(filename=file.filename, upload_date=datetime.now().isoformat())
-            db.add(new_doc)
-            db.commit()
-            db.refresh(new_doc)
-            
-        return {"message": message, "filename": file.filename}
+        # Register the row before any chunks are written, so a concurrent cleanup never sees
+        # this upload's chunks as orphans
+        await crud.upsert_document(db, file.filename, status="indexing", error=None)
+        result = await process_pdf(file)
+        stats = result["stats"]
+
+        # Mark it indexed, refreshing the upload date and chunk stats if it was already there
+        await crud.upsert_document(
+            db, file.filename,
+            upload_date=datetime.now().isoformat(),
+            chunk_count=stats["chunks"], token_count=stats["tokens"], status="indexed", error=None,
+        )
+        await crud.save_profile(db, file.filename, result["profile"])
+
+        return {"message": result["message"], "filename": file.filename, "stats": stats}
     except Exception as e:
+        await db.rollback()
+        await crud.upsert_document(db, file.filename, status="failed", error=str(e))
+        # The old chunks may already be gone, so the old profile would point at nothing
+        await crud.save_profile(db, file.filename, None)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/documents")
-async def get_documents(db: Session = Depends(get_db)):
-    docs = db.query(Document).all()
-    return {"documents": [doc.filename for doc in docs]}
+async def get_documents(db: AsyncSession = Depends(get_db)):
+    filenames = await crud.list_document_filenames(db)
+    return {"documents": filenames}
+
+@router.get("/documents/stats")
+async def get_document_stats(db: AsyncSession = Depends(get_db)):
+    return {"documents": await crud.list_document_stats(db)}
+
+@router.delete("/documents/{filename:path}")
+async def delete_document_api(filename: str, db: AsyncSession = Depends(get_db)):
+    # Chunks first: if this fails the catalog row is still there and the delete can be retried
+    chunks_deleted = await run_in_threadpool(delete_document_chunks, filename)
+    catalog_deleted = await crud.delete_document(db, filename)
+    if not chunks_deleted and not catalog_deleted:
+        raise HTTPException(status_code=404, detail=f"Document '{filename}' not found")
+    return {"filename": filename, "chunks_deleted": chunks_deleted}
+
+@router.post("/maintenance/cleanup")
+async def cleanup_index_api(dry_run: bool = False, rebuild: bool = False, db: AsyncSession = Depends(get_db)):
+    from app.core.maintenance import cleanup_index, chunk_ids_by_source, INDEXING_TIMEOUT_SECONDS
+    # Remove chunks whose document is no longer catalogued, then compact the index on disk.
+    # Scan first and read the catalog after: uploads register their row before writing chunks,
+    # so any upload whose chunks the scan saw is already in the catalog we compare against.
+    sources = await run_in_threadpool(chunk_ids_by_source)
+    filenames = await crud.list_document_filenames(db, indexed_only=False)
+    indexing, stale = await crud.list_indexing_filenames(db, INDEXING_TIMEOUT_SECONDS)
+    # Abandoned uploads don't protect their partial chunks
+    stale = set(stale)
+    filenames = [f for f in filenames if f not in stale]
+    # rebuild=true also rebuilds the HNSW segments; stop ingest_corpus.py first
+    return await run_in_threadpool(cleanup_index, filenames, dry_run, indexing, sources, rebuild)
 
 @router.get("/query")
-async def query_rag(q: str, files: str = None):
+async def query_rag(
+    q: str,
+    files: str = None,
+    k: int = Query(5, ge=1, le=50),
+    mmr: bool = False,
+    lambda_mult: float = Query(0.5, ge=0, le=1),
+    cursor: str = None,
+):
     if not q:
         raise HTTPException(status_code=400, detail="Query parameter 'q' is required")
     
@@ -42,10 +89,17 @@ async def query_rag(q: str, files: str = None):
     if files:
         file_filters = files.split(",")
     
-    results = query_documents(q, file_filters)
+    try:
+        results, next_cursor = await run_in_threadpool(
+            query_page, q, file_filters, k, cursor, mmr, lambda_mult=lambda_mult
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Generate answer using LLM
-    answer = generate_answer(q, results)
+    # Generate answer using LLM, only for the first page; "show more" just returns more sources
+    answer = None
+    if not cursor:
+        answer = await run_in_threadpool(generate_answer, q, results)
     
     # Format results for frontend
     formatted_results = [
@@ -56,7 +110,7 @@ async def query_rag(q: str, files: str = None):
         }
         for doc in results
     ]
-    return {"results": formatted_results, "answer": answer}
+    return {"results": formatted_results, "answer": answer, "next_cursor": next_cursor}
 
 @router.get("/insights")
 async def get_insights_api(filename: str):
@@ -74,6 +128,64 @@ async def compare_api(file1: str, file2: str):
     comparison = await compare_documents(file1, file2)
     return comparison
 
+async def _centroid_index(db: AsyncSession):
+    from app.core.similarity import centroid_index
+    version = await crud.profiles_version(db)
+    if not centroid_index.is_current(version):
+        centroid_index.load(version, await crud.list_centroid_rows(db))
+    return centroid_index
+
+@router.get("/similarity")
+async def similarity_matrix_api(files: str = None, db: AsyncSession = Depends(get_db)):
+    from app.core.similarity import similarity_matrix, MAX_MATRIX_DOCUMENTS
+    index = await _centroid_index(db)
+    filenames, centroids = index.filenames, index.centroids
+    # files can be a comma-separated list of filenames to restrict the matrix to
+    if files:
+        wanted = set(files.split(","))
+        rows = [i for i, f in enumerate(filenames) if f in wanted]
+        filenames, centroids = [filenames[i] for i in rows], centroids[rows]
+    # The response grows with N squared, so large corpora have to pick a subset or use /similar
+    if len(filenames) > MAX_MATRIX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Similarity matrix is limited to {MAX_MATRIX_DOCUMENTS} documents, got {len(filenames)}. "
+                   "Pass a smaller 'files' list or use /similar for per-document neighbours.",
+        )
+    matrix = similarity_matrix(centroids).round(4).tolist() if filenames else []
+    return {"documents": filenames, "matrix": matrix}
+
+@router.get("/similar")
+async def similar_documents_api(filename: str, k: int = 5, db: AsyncSession = Depends(get_db)):
+    from app.core.similarity import most_similar
+    index = await _centroid_index(db)
+    if filename not in index.filenames:
+        raise HTTPException(status_code=404, detail=f"No profile for '{filename}'")
+    return {"filename": filename, "similar": most_similar(index.filenames, index.centroids, filename, k)}
+
+@router.post("/compare/multi")
+async def compare_multi_api(files: list[str], sections_per_document: int = 3, db: AsyncSession = Depends(get_db)):
+    from app.core.similarity import profile_from_row
+    if len(set(files)) < 2:
+        raise HTTPException(status_code=400, detail="At least two different files are required")
+    rows = {row.filename: row for row in await crud.get_profile_rows(db, files)}
+    missing = [f for f in files if f not in rows]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"No profile for: {', '.join(missing)}")
+    profiles = {f: profile_from_row(rows[f]) for f in files}
+    return await run_in_threadpool(compare_many, profiles, sections_per_document)
+
+@router.post("/maintenance/profiles")
+async def backfill_profiles_api(db: AsyncSession = Depends(get_db)):
+    # Build profiles for documents indexed before profiles existed, from the vectors already in Chroma
+    built = []
+    for filename in await crud.list_filenames_without_profile(db):
+        profile = await run_in_threadpool(build_document_profile, filename)
+        if profile is not None:
+            await crud.save_profile(db, filename, profile)
+            built.append(filename)
+    return {"profiles_built": built}
+
 @router.post("/evaluate/generate")
 async def generate_test_set_api(files: list[str] = None, num_samples: int = 20):
     from app.core.evaluation import generate_test_set
@@ -0,0 +1,155 @@
+import bisect
+import os
+import re
+import statistics
+import threading
+from app.core.startup import lazy_import
+
+# Chunk sizes are measured in tokens of the embedding model, not characters.
+# all-MiniLM-L6-v2 truncates input at 256 word pieces, so anything past that is never embedded.
+TOKENIZER_MODEL = os.getenv("CHUNK_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "250"))
+# An integer number of tokens, or "auto" to size the overlap from the document's sentence length
+CHUNK_OVERLAP = os.getenv("CHUNK_OVERLAP", "auto")
+
+# Adaptive overlap never goes above this fraction of the chunk size
+MAX_OVERLAP_RATIO = 0.2
+# How many sentences to sample when estimating the adaptive overlap
+OVERLAP_SAMPLE_SENTENCES = 200
+
+# Pages are joined with a plain space so a page break never outranks the page's own paragraph,
+# line or sentence breaks; otherwise the splitter cuts at every page end and leaves a short tail.
+# Page boundaries are tracked separately through the offsets table in chunk_pages.
+PAGE_SEPARATOR = " "
+SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", "; ", ", ", " ", ""]
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+def get_token_counter():
+    """
+    Returns a function counting tokens the way the embedding model does.
+
+    There's deliberately no fallback tokenizer: sizing chunks in another model's tokens lets them
+    run past the embedding model's limit and get silently truncated. A load failure (often just a
+    transient download error) raises instead and nothing is cached, so the next call retries.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                try:
+                    tokenizer = lazy_import("transformers").AutoTokenizer.from_pretrained(TOKENIZER_MODEL)
+                except Exception as e:
+                    raise RuntimeError(f"Could not load the {TOKENIZER_MODEL} tokenizer for chunk sizing: {e}") from e
+                # We only count tokens, silence the "sequence longer than max length" warning
+                tokenizer.model_max_length = int(1e9)
+                _tokenizer = lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    return _tokenizer
+
+def adaptive_overlap(text: str, chunk_tokens: int, count_tokens) -> int:
+    """
+    Picks an overlap of roughly one typical sentence, so a sentence cut at a chunk
+    boundary still appears whole in one of the two chunks.
+    """
+    sentences = [s for s in _SENTENCE_RE.split(text) if s.strip()]
+    if not sentences:
+        return 0
+    step = max(1, len(sentences) // OVERLAP_SAMPLE_SENTENCES)
+    lengths = [count_tokens(s) for s in sentences[::step]]
+    return min(int(statistics.median(lengths)), int(chunk_tokens * MAX_OVERLAP_RATIO))
+
+def resolve_overlap(overlap, text: str, chunk_tokens: int, count_tokens) -> int:
+    if overlap is None:
+        overlap = CHUNK_OVERLAP
+    if isinstance(overlap, str):
+        if overlap.lower() == "auto":
+            return adaptive_overlap(text, chunk_tokens, count_tokens)
+        overlap = int(overlap)
+    if overlap < 0 or overlap >= chunk_tokens:
+        raise ValueError(f"Chunk overlap must be between 0 and {chunk_tokens - 1} tokens, got {overlap}")
+    return overlap
+
+def chunk_pages(pages: list, source: str, chunk_tokens: int = None, overlap=None):
+    """
+    Split a document's pages into token-sized chunks.
+
+    Pages are joined into one text before splitting, so a chunk can run across a
+    page break instead of leaving a short tail at the end of every page. Each chunk
+    keeps "page" (first page, as before) and "page_end" in its metadata.
+
+    Returns (chunks, stats).
+    """
+    Document = lazy_import("langchain_core.documents").Document
+    RecursiveCharacterTextSplitter = lazy_import("langchain_text_splitters").RecursiveCharacterTextSplitter
+
+    chunk_tokens = chunk_tokens or CHUNK_TOKENS
+
+    # Join the pages, remembering where each one starts in the combined text
+    parts = []
+    page_offsets = []
+    page_numbers = []
+    offset = 0
+    for i, page in enumerate(pages):
+        content = page.page_content.strip()
+        if not content:
+            continue
+        page_offsets.append(offset)
+        page_numbers.append(page.metadata.get("page", i))
+        parts.append(content)
+        offset += len(content) + len(PAGE_SEPARATOR)
+    text = PAGE_SEPARATOR.join(parts)
+
+    if not text:
+        return [], _chunk_stats([], len(pages), chunk_tokens, 0)
+
+    count_tokens = get_token_counter()
+    overlap = resolve_overlap(overlap, text, chunk_tokens, count_tokens)
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens,
+        chunk_overlap=overlap,
+        length_function=count_tokens,
+        separators=SEPARATORS,
+    )
+
+    chunks = []
+    search_from = 0
+    for content in text_splitter.split_text(text):
+        # Locate the chunk ourselves: the splitter's add_start_index treats the overlap as
+        # a character count, which is wrong once lengths are measured in tokens.
+        start = text.find(content, search_from)
+        if start < 0:
+            start = search_from
+        search_from = start + 1
+        end = start + max(len(content) - 1, 0)
+        first = bisect.bisect_right(page_offsets, start) - 1
+        last = bisect.bisect_right(page_offsets, end) - 1
+        chunks.append(Document(
+            page_content=content,
+            metadata={
+                "source": source,
+                "page": page_numbers[first],
+                "page_end": page_numbers[last],
+                "start_index": start,
+                "tokens": count_tokens(content),
+            },
+        ))
+
+    return chunks, _chunk_stats(chunks, len(pages), chunk_tokens, overlap)
+
+def _chunk_stats(chunks: list, page_count: int, chunk_tokens: int, overlap: int) -> dict:
+    tokens = [chunk.metadata["tokens"] for chunk in chunks]
+    return {
+        "pages": page_count,
+        "chunks": len(chunks),
+        "tokens": sum(tokens),
+        "min_tokens": min(tokens, default=0),
+        "max_tokens": max(tokens, default=0),
+        "mean_tokens": round(statistics.mean(tokens), 1) if tokens else 0,
+        "chunk_size_tokens": chunk_tokens,
+        "overlap_tokens": overlap,
+        "cross_page_chunks": sum(1 for c in chunks if c.metadata["page_end"] != c.metadata["page"]),
+    }
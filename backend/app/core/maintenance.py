@@ -0,0 +1,156 @@
+import os
+import sqlite3
+from app.core.rag import get_vectorstore, reset_vectorstore, index_write_lock, PERSIST_DIRECTORY, COLLECTION_NAME
+
+# Page size when scanning the whole collection, and batch size for deletes
+SCAN_BATCH_SIZE = 5000
+
+# A document still "indexing" after this long was abandoned (e.g. the server died mid-upload)
+INDEXING_TIMEOUT_SECONDS = int(os.getenv("INDEXING_TIMEOUT_SECONDS", "3600"))
+
+SQLITE_FILE = "chroma.sqlite3"
+
+def index_size_bytes(path: str = PERSIST_DIRECTORY) -> dict:
+    """
+    On-disk size of the index, split into Chroma's SQLite store and the HNSW segment
+    directories (one per collection) next to it.
+    """
+    sizes = {"sqlite": 0, "hnsw": 0}
+    if not os.path.isdir(path):
+        return sizes
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            for dirpath, _, filenames in os.walk(entry.path):
+                sizes["hnsw"] += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        elif entry.name.startswith(SQLITE_FILE):
+            sizes["sqlite"] += entry.stat().st_size
+    return sizes
+
+def chunk_ids_by_source() -> dict:
+    """
+    Scans the whole collection (metadata only) and groups chunk ids by their source filename.
+    Chunks without a source are grouped under None.
+    """
+    collection = get_vectorstore()._collection
+    sources = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=SCAN_BATCH_SIZE, offset=offset)
+        ids = page["ids"]
+        if not ids:
+            break
+        for chunk_id, meta in zip(ids, page["metadatas"]):
+            source = meta.get("source") if meta else None
+            sources.setdefault(source, []).append(chunk_id)
+        offset += len(ids)
+    return sources
+
+def rebuild_collection() -> int:
+    """
+    Copies every live vector into a fresh collection and swaps it in under the same name.
+
+    Chroma's HNSW segments only mark deleted entries; their .bin files never shrink and searches
+    still walk the dead nodes. Rebuilding from the live vectors is the only way to reclaim that.
+
+    Writes from this process wait on index_write_lock until the swap is done. ingest_corpus.py
+    runs in its own process and keeps a handle to the old collection, so it must not be running:
+    anything it writes during the copy is lost, and every file after the swap fails.
+    Returns the number of vectors copied.
+    """
+    with index_write_lock:
+        vectorstore = get_vectorstore()
+        client = vectorstore._client
+        source = vectorstore._collection
+        staging_name = f"{COLLECTION_NAME}__rebuild"
+
+        # Leftover from an interrupted rebuild
+        try:
+            client.delete_collection(staging_name)
+        except Exception:
+            pass
+        staging = client.create_collection(staging_name, metadata=source.metadata or None, embedding_function=None)
+
+        copied = 0
+        while True:
+            page = source.get(
+                include=["embeddings", "documents", "metadatas"], limit=SCAN_BATCH_SIZE, offset=copied
+            )
+            if not page["ids"]:
+                break
+            staging.add(
+                ids=page["ids"], embeddings=page["embeddings"],
+                documents=page["documents"], metadatas=page["metadatas"],
+            )
+            copied += len(page["ids"])
+
+        # Only an outside writer can get here, i.e. an ingest_corpus.py run that should have been stopped
+        if copied != source.count():
+            client.delete_collection(staging_name)
+            raise RuntimeError("Index changed during rebuild, stop ingest_corpus.py and run cleanup again")
+
+        client.delete_collection(COLLECTION_NAME)
+        staging.modify(name=COLLECTION_NAME)
+        reset_vectorstore()
+    return copied
+
+def compact_index(rebuild: bool = False):
+    """
+    Gives space freed by deletes back to the filesystem: optionally rebuilds the HNSW segments
+    (see rebuild_collection), then VACUUMs Chroma's SQLite store.
+    """
+    if rebuild:
+        rebuild_collection()
+    db_path = os.path.join(PERSIST_DIRECTORY, SQLITE_FILE)
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+def cleanup_index(
+    catalog_filenames, dry_run: bool = False, indexing=(), sources: dict = None, rebuild: bool = False,
+) -> dict:
+    """
+    Finds orphaned chunks (indexed under a source that isn't in the Document table), deletes them
+    and compacts the on-disk index. With dry_run nothing is changed, only reported.
+
+    Sources in indexing are mid-upload and never touched. sources is a chunk_ids_by_source() scan
+    the caller already made; it's taken here when not given.
+
+    rebuild=True also rebuilds the HNSW segments (see rebuild_collection) when chunks were deleted
+    and no upload is in progress. It copies the whole corpus, so it's opt-in, and ingest_corpus.py
+    must be stopped while it runs.
+    """
+    size_before = index_size_bytes()
+    indexing = set(indexing)
+    catalog = set(catalog_filenames) | indexing
+    if sources is None:
+        sources = chunk_ids_by_source()
+
+    orphans = {source: ids for source, ids in sources.items() if source not in catalog}
+    orphan_ids = [chunk_id for ids in orphans.values() for chunk_id in ids]
+
+    rebuilt = False
+    if not dry_run:
+        with index_write_lock:
+            collection = get_vectorstore()._collection
+            for i in range(0, len(orphan_ids), SCAN_BATCH_SIZE):
+                collection.delete(ids=orphan_ids[i:i + SCAN_BATCH_SIZE])
+            # Swapping the collection under a running upload would drop its writes
+            rebuilt = rebuild and bool(orphan_ids) and not indexing
+            compact_index(rebuild=rebuilt)
+
+    return {
+        "dry_run": dry_run,
+        "orphaned_sources": sorted(str(source) for source in orphans),
+        "orphaned_chunks": len(orphan_ids),
+        # Catalogued but nothing indexed, e.g. a failed ingest or an empty PDF
+        "documents_without_chunks": sorted(catalog - indexing - set(sources)),
+        "skipped_indexing": sorted(indexing),
+        "chunks_remaining": sum(len(ids) for ids in sources.values()) - (0 if dry_run else len(orphan_ids)),
+        "rebuilt": rebuilt,
+        "index_bytes_before": size_before,
+        "index_bytes_after": size_before if dry_run else index_size_bytes(),
+    }
@@ -1,25 +1,42 @@
 from fastapi import UploadFile
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_groq import ChatGroq
-from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+from starlette.concurrency import run_in_threadpool
+from app.core.startup import lazy_import
+from app.core.chunking import chunk_pages
+from app.core.cache import TTLCache
+import base64
 import shutil
 import tempfile
 import os
 import random
+import threading
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Provider SDKs, torch (via langchain_huggingface), Chroma and the PDF loader are all
+# imported lazily through lazy_import() so that importing this module stays cheap and
+# only the configured LLM provider is ever loaded.
+
 # Initialize Vector Store (ChromaDB)
 # Persist directory for the vector DB
 PERSIST_DIRECTORY = "./chroma_db"
+COLLECTION_NAME = "pdf_documents"
+
+# Chroma rejects very large single writes
+UPSERT_BATCH_SIZE = 1000
+
+# Candidates fetched per search; pagination and MMR work within this pool
+DEFAULT_FETCH_K = int(os.getenv("SEARCH_FETCH_K", "50"))
+
+# Ranked result lists by search id, so follow-up pages don't repeat the search
+_search_cache = TTLCache(maxsize=512, ttl=600)
+
+_embeddings = None
+_vectorstore = None
+_init_lock = threading.Lock()
+# Held by everything that writes chunks, so maintenance can swap the collection without losing writes
+index_write_lock = threading.RLock()
 
 def get_valid_key(name):
     key = os.getenv(name)
@@ -31,11 +48,18 @@ def get_embeddings():
     """
     Returns the embeddings model.
     Using Local HuggingFace embeddings to avoid API quotas and costs.
+    Loaded once per process; the model takes seconds to load.
     """
-    # You can switch this back to OpenAI/Gemini if you have a paid plan
-    hf_token = os.getenv("HF_TOKEN")
-    model_kwargs = {"token": hf_token} if hf_token else {}
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs=model_kwargs)
+    global _embeddings
+    if _embeddings is None:
+        with _init_lock:
+            if _embeddings is None:
+                HuggingFaceEmbeddings = lazy_import("langchain_huggingface").HuggingFaceEmbeddings
+                # You can switch this back to OpenAI/Gemini if you have a paid plan
+                hf_token = os.getenv("HF_TOKEN")
+                model_kwargs = {"token": hf_token} if hf_token else {}
+                _embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs=model_kwargs)
+    return _embeddings
 
 def get_llm(temperature=0):
     """
@@ -47,6 +71,7 @@ def get_llm(temperature=0):
     google_key = get_valid_key("GOOGLE_API_KEY")
     
     if groq_key:
+        ChatGroq = lazy_import("langchain_groq").ChatGroq
         return ChatGroq(
             model="llama-3.1-8b-instant",
             temperature=temperature,
@@ -58,30 +83,53 @@ def get_llm(temperature=0):
         # "If both are valid, use either one of them" -> Randomly pick for fun/load balancing
         use_openai = random.choice([True, False])
         if use_openai:
-            return ChatOpenAI(model="gpt-3.5-turbo", temperature=temperature)
+            return _openai_llm(temperature)
         else:
-            return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=temperature)
+            return _gemini_llm(temperature)
             
     if openai_key:
-        return ChatOpenAI(model="gpt-3.5-turbo", temperature=temperature)
+        return _openai_llm(temperature)
     elif google_key:
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=temperature)
+        return _gemini_llm(temperature)
     else:
         raise ValueError("No valid API key found. Please set GROQ_API_KEY, OPENAI_API_KEY, or GOOGLE_API_KEY in .env")
 
+def _openai_llm(temperature):
+    ChatOpenAI = lazy_import("langchain_openai").ChatOpenAI
+    return ChatOpenAI(model="gpt-3.5-turbo", temperature=temperature)
+
+def _gemini_llm(temperature):
+    ChatGoogleGenerativeAI = lazy_import("langchain_google_genai").ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=temperature)
+
 def get_vectorstore():
-    embeddings = get_embeddings()
-    vectorstore = Chroma(
-        persist_directory=PERSIST_DIRECTORY,
-        embedding_function=embeddings,
-        collection_name="pdf_documents"
-    )
-    return vectorstore
+    global _vectorstore
+    if _vectorstore is None:
+        embeddings = get_embeddings()
+        with _init_lock:
+            if _vectorstore is None:
+                Chroma = lazy_import("langchain_chroma").Chroma
+                _vectorstore = Chroma(
+                    persist_directory=PERSIST_DIRECTORY,
+                    embedding_function=embeddings,
+                    collection_name=COLLECTION_NAME
+                )
+    return _vectorstore
+
+def reset_vectorstore():
+    """
+    Drops the cached vector store so the next get_vectorstore() reopens the collection by name,
+    e.g. after maintenance swapped in a rebuilt one.
+    """
+    global _vectorstore
+    with _init_lock:
+        _vectorstore = None
+    _search_cache.clear()
 
-async def process_pdf(file: UploadFile) -> str:
+async def process_pdf(file: UploadFile) -> dict:
     """
     Process an uploaded PDF file: save temp, load, split, and index.
-    Returns the document ID or filename.
+    Returns the status message and chunk statistics.
     """
     # Save uploaded file to a temporary file
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
@@ -89,33 +137,98 @@ async def process_pdf(file: UploadFile) -> str:
         tmp_path = tmp_file.name
 
     try:
-        # Load PDF
-        loader = PyPDFLoader(tmp_path)
-        documents = loader.load()
-
-        # Split text
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            add_start_index=True
-        )
-        splits = text_splitter.split_documents(documents)
-
-        # Add metadata (filename) to each split
-        for split in splits:
-            split.metadata["source"] = file.filename
-
-        # Index into Vector Store
-        vectorstore = get_vectorstore()
-        vectorstore.add_documents(documents=splits)
-        
-        return f"Successfully processed {len(splits)} chunks from {file.filename}"
+        # Parsing + embedding is blocking work, keep it off the event loop
+        return await run_in_threadpool(index_pdf, tmp_path, file.filename)
 
     finally:
         # Clean up temp file
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
 
+def index_pdf(path: str, filename: str) -> dict:
+    """
+    Load, chunk and index a PDF from disk under the given filename.
+    Returns a status message plus the chunk statistics for the document.
+    """
+    splits, stats = load_and_chunk(path, filename)
+
+    # Index into Vector Store
+    profile = replace_document_chunks(filename, splits)
+
+    return {
+        "message": f"Successfully processed {len(splits)} chunks from {filename}",
+        "stats": stats,
+        "profile": profile,
+    }
+
+def load_and_chunk(path: str, filename: str):
+    """
+    Parse a PDF and split it into chunks tagged with the filename. Pure CPU work, no index access,
+    so the bulk ingester can run it in worker processes.
+    Returns (chunks, stats).
+    """
+    PyPDFLoader = lazy_import("langchain_community.document_loaders").PyPDFLoader
+
+    # Load PDF
+    loader = PyPDFLoader(path)
+    pages = loader.load()
+
+    # Token-sized chunks that may span page breaks, tagged with the filename
+    return chunk_pages(pages, filename)
+
+def replace_document_chunks(filename: str, splits: list):
+    """
+    Swap out whatever is indexed for filename with the given chunks.
+    Chunk ids are derived from the filename so re-indexing the same file never duplicates chunks.
+    Returns the document's embedding profile (see app.core.similarity), or None if it has no chunks.
+    """
+    from app.core.similarity import build_profile
+
+    # Embed here rather than through add_documents so the vectors can also feed the profile.
+    # Done before taking the write lock, it's the slow part and touches no shared state.
+    texts = [split.page_content for split in splits]
+    vectors = get_embeddings().embed_documents(texts) if splits else []
+    ids = [f"{filename}::{i}" for i in range(len(splits))]
+
+    with index_write_lock:
+        delete_document_chunks(filename)
+        if not splits:
+            return None
+        collection = get_vectorstore()._collection
+        for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+            collection.upsert(
+                ids=ids[i:i + UPSERT_BATCH_SIZE],
+                embeddings=vectors[i:i + UPSERT_BATCH_SIZE],
+                documents=texts[i:i + UPSERT_BATCH_SIZE],
+                metadatas=[split.metadata for split in splits[i:i + UPSERT_BATCH_SIZE]],
+            )
+    return build_profile(ids, vectors)
+
+def build_document_profile(filename: str):
+    """
+    Rebuild a document's profile from the vectors already in the index.
+    Used to backfill documents indexed before profiles existed.
+    """
+    from app.core.similarity import build_profile
+
+    data = get_vectorstore()._collection.get(where={"source": filename}, include=["embeddings"])
+    if not data["ids"]:
+        return None
+    return build_profile(data["ids"], data["embeddings"])
+
+def delete_document_chunks(filename: str) -> int:
+    """
+    Remove every chunk indexed for filename. Returns how many were deleted.
+    """
+    with index_write_lock:
+        collection = get_vectorstore()._collection
+        ids = collection.get(where={"source": filename}, include=[])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+            # Cached rankings may point at these chunks; later pages just re-run the search
+            _search_cache.clear()
+    return len(ids)
+
 def list_documents():
     """
     Returns a list of unique filenames of uploaded documents.
@@ -140,26 +253,114 @@ def list_documents():
         print(f"Error listing documents: {e}")
         return []
 
-def query_documents(query: str, file_filters: list[str] = None):
+def _source_filter(file_filters: list[str] = None):
+    if not file_filters:
+        return None
+    # Chroma filter syntax for "OR" logic with metadata is a bit specific.
+    # If filtering by multiple files: {"source": {"$in": [file1, file2]}}
+    if len(file_filters) == 1:
+        return {"source": file_filters[0]}
+    return {"source": {"$in": file_filters}}
+
+def search_documents(query: str, file_filters: list[str] = None, fetch_k: int = DEFAULT_FETCH_K,
+                     mmr: bool = False, lambda_mult: float = 0.5):
+    """
+    Fetch up to fetch_k candidate chunks in one vector query and return them all ranked:
+    by similarity, or with mmr=True by maximal marginal relevance over the candidates' vectors.
+    """
+    Document = lazy_import("langchain_core.documents").Document
+
+    query_vector = get_embeddings().embed_query(query)
+    data = get_vectorstore()._collection.query(
+        query_embeddings=[query_vector],
+        n_results=fetch_k,
+        where=_source_filter(file_filters),
+        include=["documents", "metadatas", "embeddings"] if mmr else ["documents", "metadatas"],
+    )
+    ids = data["ids"][0]
+    texts = data["documents"][0]
+    metadatas = data["metadatas"][0]
+    if not texts:
+        return []
+
+    order = range(len(texts))
+    if mmr:
+        from app.core.similarity import mmr_order
+        order = mmr_order(query_vector, data["embeddings"][0], lambda_mult)
+
+    return [Document(id=ids[i], page_content=texts[i], metadata=metadatas[i] or {}) for i in order]
+
+def get_chunks(chunk_ids: list):
+    """
+    Current text and metadata for the given chunk ids, in the given order.
+    Ids no longer in the index are skipped.
+    """
+    Document = lazy_import("langchain_core.documents").Document
+
+    if not chunk_ids:
+        return []
+    data = get_vectorstore()._collection.get(ids=chunk_ids, include=["documents", "metadatas"])
+    found = {
+        chunk_id: Document(id=chunk_id, page_content=text, metadata=meta or {})
+        for chunk_id, text, meta in zip(data["ids"], data["documents"], data["metadatas"])
+    }
+    return [found[chunk_id] for chunk_id in chunk_ids if chunk_id in found]
+
+def query_documents(query: str, file_filters: list[str] = None, k: int = 5, mmr: bool = False,
+                    fetch_k: int = DEFAULT_FETCH_K, lambda_mult: float = 0.5):
     """
     Query the vector store for relevant documents.
-    Optional: filter by specific filenames.
+    Optional: filter by specific filenames, diversify with MMR.
     """
-    vectorstore = get_vectorstore()
-    
-    search_kwargs = {"k": 5}
-    if file_filters:
-        # Chroma filter syntax for "OR" logic with metadata is a bit specific.
-        # If filtering by multiple files: {"source": {"$in": [file1, file2]}}
-        if len(file_filters) == 1:
-            search_kwargs["filter"] = {"source": file_filters[0]}
-        else:
-            search_kwargs["filter"] = {"source": {"$in": file_filters}}
-            
-    # Vector Retriever Only
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs=search_kwargs)
-    results = retriever.invoke(query)
-    return results
+    return search_documents(query, file_filters, max(k, fetch_k) if mmr else k, mmr, lambda_mult)[:k]
+
+def query_page(query: str, file_filters: list[str] = None, k: int = 5, cursor: str = None,
+               mmr: bool = False, fetch_k: int = DEFAULT_FETCH_K, lambda_mult: float = 0.5):
+    """
+    One page of ranked results plus a cursor for the next page.
+
+    The first page runs the search once (over-fetching fetch_k candidates) and caches the ranked chunk
+    ids; following pages slice that list and fetch just those chunks by id, so "show more" costs no
+    embedding or vector query. Fetching by id means a page never shows text that was deleted or
+    replaced since the search (e.g. by the ingest CLI, which can't clear this process's cache).
+    If the cached search has expired the search is simply re-run, still over fetch_k candidates only;
+    a cursor offset beyond that is rejected with ValueError rather than widening the search.
+    Returns (docs, next_cursor); next_cursor is None when there's nothing more.
+    """
+    # A search never ranks more than this many candidates, so no genuine cursor points past it
+    pool_size = max(fetch_k, k)
+    offset = 0
+    search_id = None
+    if cursor:
+        search_id, offset = _decode_cursor(cursor)
+        if offset >= pool_size:
+            raise ValueError("Invalid cursor")
+
+    key = (query, tuple(sorted(file_filters or [])), mmr, lambda_mult)
+    cached = _search_cache.get(search_id) if search_id else None
+    if cached is not None and cached[0] == key:
+        ranked_ids = cached[1]
+        page = get_chunks(ranked_ids[offset:offset + k])
+    else:
+        ranked = search_documents(query, file_filters, pool_size, mmr, lambda_mult)
+        ranked_ids = [doc.id for doc in ranked]
+        search_id = uuid.uuid4().hex
+        _search_cache.set(search_id, (key, ranked_ids))
+        page = ranked[offset:offset + k]
+
+    next_offset = min(offset + k, len(ranked_ids))
+    next_cursor = _encode_cursor(search_id, next_offset) if offset < next_offset < len(ranked_ids) else None
+    return page, next_cursor
+
+def _encode_cursor(search_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{search_id}:{offset}".encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        search_id, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return search_id, max(int(offset), 0)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
 
 def generate_answer(query: str, context_docs: list):
     """
@@ -217,6 +418,9 @@ async def generate_insights(filename: str):
 
     llm = get_llm(temperature=0)
     
+    ChatPromptTemplate = lazy_import("langchain_core.prompts").ChatPromptTemplate
+    JsonOutputParser = lazy_import("langchain_core.output_parsers").JsonOutputParser
+
     prompt = ChatPromptTemplate.from_template(
         """
         You are an AI analyst. Analyze the following text from a document:
@@ -264,6 +468,9 @@ async def compare_documents(file1: str, file2: str):
 
     llm = get_llm(temperature=0)
     
+    ChatPromptTemplate = lazy_import("langchain_core.prompts").ChatPromptTemplate
+    JsonOutputParser = lazy_import("langchain_core.output_parsers").JsonOutputParser
+
     prompt = ChatPromptTemplate.from_template(
         """
         Compare the following two document contexts:
@@ -292,3 +499,59 @@ async def compare_documents(file1: str, file2: str):
     except Exception as e:
         return {"error": str(e)}
 
+
+def compare_many(profiles: dict, sections_per_document: int = 3):
+    """
+    Compare any number of documents using their embedding profiles.
+    Only each document's most divergent sections go to the LLM; the overall similarity
+    comes from the profile centroids and needs no LLM call.
+    Blocking (Chroma read plus the LLM call), so run it in a thread from async code.
+    """
+    from app.core.similarity import divergent_sections, similarity_matrix
+    import numpy as np
+
+    filenames = list(profiles)
+    sections = divergent_sections(profiles, sections_per_document)
+
+    chunk_ids = [chunk_id for ids in sections.values() for chunk_id in ids]
+    data = get_vectorstore()._collection.get(ids=chunk_ids, include=["documents"])
+    texts = dict(zip(data["ids"], data["documents"]))
+
+    context = ""
+    for i, filename in enumerate(filenames, start=1):
+        context += f"Document {i} ({filename}):\n"
+        context += "\n".join(texts[chunk_id] for chunk_id in sections[filename] if chunk_id in texts)
+        context += "\n\n"
+
+    matrix = similarity_matrix(np.vstack([profiles[f]["centroid"] for f in filenames]))
+    result = {
+        "documents": filenames,
+        "similarity_matrix": np.round(matrix, 4).tolist(),
+    }
+
+    llm = get_llm(temperature=0)
+
+    ChatPromptTemplate = lazy_import("langchain_core.prompts").ChatPromptTemplate
+    JsonOutputParser = lazy_import("langchain_core.output_parsers").JsonOutputParser
+
+    prompt = ChatPromptTemplate.from_template(
+        """
+        Compare the following documents. For each one you are given the sections that differ
+        most from the other documents:
+        
+        {context}
+        
+        Provide a comparison in JSON format with the following keys:
+        1. "similarities": List of common points.
+        2. "differences": List of key differences, naming the documents involved.
+        3. "conclusion": A brief concluding remark on how they relate.
+        """
+    )
+    
+    chain = prompt | llm | JsonOutputParser()
+    
+    try:
+        result.update(chain.invoke({"context": context}))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
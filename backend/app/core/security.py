@@ -1,13 +1,29 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
+from app.core.cache import TTLCache
 
-# Secret key for JWT (in prod, use env var)
-SECRET_KEY = "supersecretkey"
+# Secret key for JWT. The built-in default is only fit for local use with auth disabled,
+# anyone who knows it can mint tokens
+DEFAULT_SECRET_KEY = "supersecretkey"
+SECRET_KEY = os.getenv("SECRET_KEY") or DEFAULT_SECRET_KEY
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt runs in its own small process pool so a burst of logins can't starve the threadpool
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hash jobs allowed to wait for a worker before new ones are rejected
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+# Login/register attempts allowed per account per minute
+AUTH_ATTEMPTS_PER_MINUTE = int(os.getenv("AUTH_ATTEMPTS_PER_MINUTE", "10"))
+
 def verify_password(plain_password, hashed_password):
     # bcrypt.checkpw requires bytes
     if isinstance(plain_password, str):
@@ -31,3 +47,76 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verify the signature and expiry of a token and return its claims. Raises JWTError if invalid.
+    """
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+class PasswordHashBusy(Exception):
+    """
+    Raised when too many hash jobs are already queued.
+    """
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_pending = 0
+
+def _get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                # spawn, not fork: the API process may already have torch threads running
+                _hash_pool = ProcessPoolExecutor(
+                    max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _hash_pool
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+async def _run_hash_job(func, *args):
+    global _hash_pending
+    if _hash_pending >= HASH_MAX_PENDING:
+        raise PasswordHashBusy()
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_pool(), func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_hash_job(get_password_hash, password)
+
+class RateLimiter:
+    """
+    Token bucket per key: up to `rate` attempts per `per` seconds, refilling continuously.
+    """
+
+    def __init__(self, rate: int, per: float = 60.0, max_keys: int = 10000):
+        self.rate = rate
+        self.per = per
+        self._buckets = TTLCache(maxsize=max_keys, ttl=per)
+        self._lock = threading.Lock()
+
+    def allow(self, key) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.rate, now))
+            tokens = min(self.rate, tokens + (now - last) * self.rate / self.per)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets.set(key, (tokens, now))
+        return allowed
+
+auth_rate_limiter = RateLimiter(AUTH_ATTEMPTS_PER_MINUTE)
@@ -0,0 +1,156 @@
+import json
+import numpy as np
+
+# How many representative chunks to keep per document profile
+PROFILE_REPRESENTATIVES = 8
+
+# Largest N the N x N similarity matrix is returned for; beyond that use most_similar()
+MAX_MATRIX_DOCUMENTS = 200
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalise rows so dot products are cosine similarities.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def build_profile(ids: list, vectors, n_representatives: int = PROFILE_REPRESENTATIVES) -> dict:
+    """
+    Summarise a document's chunk embeddings as a centroid plus a few representative chunks.
+
+    Representatives are picked by farthest-point sampling: start from the chunk closest to the
+    centroid, then repeatedly add the chunk least similar to everything picked so far. That covers
+    the document's distinct sections rather than several near-copies of its main theme.
+    """
+    vectors = normalize(np.asarray(vectors, dtype=np.float32))
+    centroid = normalize(vectors.mean(axis=0))
+
+    k = min(n_representatives, len(ids))
+    picked = [int(np.argmax(vectors @ centroid))]
+    # closest[i] = highest similarity of chunk i to any picked chunk
+    closest = vectors @ vectors[picked[0]]
+    for _ in range(k - 1):
+        closest[picked] = np.inf
+        nxt = int(np.argmin(closest))
+        picked.append(nxt)
+        closest = np.maximum(closest, vectors @ vectors[nxt])
+
+    return {
+        "centroid": centroid,
+        "rep_ids": [ids[i] for i in picked],
+        "rep_vectors": vectors[picked],
+        "chunk_count": len(ids),
+    }
+
+def similarity_matrix(centroids: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity between every pair of documents, from their (normalised) centroids.
+    """
+    return centroids @ centroids.T
+
+def most_similar(filenames: list, centroids: np.ndarray, filename: str, k: int = 5) -> list:
+    """
+    The k documents whose centroids are closest to filename's.
+    """
+    i = filenames.index(filename)
+    scores = centroids @ centroids[i]
+    scores[i] = -np.inf
+    k = min(k, len(filenames) - 1)
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [{"filename": filenames[j], "score": round(float(scores[j]), 4)} for j in top]
+
+def divergent_sections(profiles: dict, per_document: int = 3) -> dict:
+    """
+    For each document, the representative chunks least like anything in the other documents.
+
+    A section's score is its highest cosine similarity to any other document's representatives;
+    the lowest-scoring ones are what sets the document apart, so only those need an LLM's attention.
+    Returns {filename: [chunk_id, ...]}.
+    """
+    filenames = list(profiles)
+    all_vectors = np.vstack([profiles[f]["rep_vectors"] for f in filenames])
+    owner = np.concatenate([np.full(len(profiles[f]["rep_ids"]), i) for i, f in enumerate(filenames)])
+
+    # One matrix product for every pair of representative chunks
+    sims = all_vectors @ all_vectors.T
+    sims[owner[:, None] == owner[None, :]] = -np.inf
+    best_match = sims.max(axis=1)
+
+    sections = {}
+    offset = 0
+    for f in filenames:
+        n = len(profiles[f]["rep_ids"])
+        order = np.argsort(best_match[offset:offset + n])[:per_document]
+        sections[f] = [profiles[f]["rep_ids"][j] for j in order]
+        offset += n
+    return sections
+
+def mmr_order(query_vector, vectors, lambda_mult: float = 0.5, k: int = None) -> list:
+    """
+    Maximal marginal relevance ranking of candidate vectors for a query.
+
+    Each pick maximises lambda * relevance - (1 - lambda) * (similarity to the closest already-picked
+    candidate). The candidate-to-candidate similarities are one matrix product up front, so each
+    step is just a vector max. lambda_mult=1 is plain relevance order, 0 is maximum diversity.
+    Returns candidate indices in ranked order.
+    """
+    vectors = normalize(np.asarray(vectors, dtype=np.float32))
+    query = normalize(np.asarray(query_vector, dtype=np.float32))
+    n = len(vectors)
+    k = n if k is None else min(k, n)
+    if k == 0:
+        return []
+
+    relevance = vectors @ query
+    pairwise = vectors @ vectors.T
+
+    first = int(np.argmax(relevance))
+    picked = [first]
+    redundancy = pairwise[first].copy()
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[picked] = -np.inf
+        nxt = int(np.argmax(scores))
+        picked.append(nxt)
+        redundancy = np.maximum(redundancy, pairwise[nxt])
+    return picked
+
+def profile_from_row(row) -> dict:
+    """
+    Turn a DocumentProfile row back into the arrays build_profile() produced.
+    """
+    rep_ids = json.loads(row.rep_ids)
+    return {
+        "centroid": np.frombuffer(row.centroid, dtype=np.float32),
+        "rep_ids": rep_ids,
+        "rep_vectors": np.frombuffer(row.rep_vectors, dtype=np.float32).reshape(len(rep_ids), row.dim),
+        "chunk_count": row.chunk_count,
+    }
+
+class CentroidIndex:
+    """
+    In-memory matrix of every document's centroid, so corpus-wide similarity is a single matrix product.
+    Reloaded only when the profiles table changes (tracked by row count and latest updated_at).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.filenames = []
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+
+    def is_current(self, version) -> bool:
+        return self.version == tuple(version)
+
+    def load(self, version, rows):
+        self.filenames = [row.filename for row in rows]
+        if rows:
+            self.centroids = np.vstack([np.frombuffer(row.centroid, dtype=np.float32) for row in rows])
+        else:
+            self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.version = tuple(version)
+
+centroid_index = CentroidIndex()
@@ -0,0 +1,86 @@
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Wall-clock seconds spent importing each module, in the order they were loaded.
+# Covers both the app modules loaded at startup and the heavy libraries loaded lazily on first use.
+_import_times: dict[str, float] = {}
+
+_process_start = time.perf_counter()
+_ready_at = None
+_preload_state = {"status": "idle", "error": None, "seconds": None}
+
+def lazy_import(name: str):
+    """
+    Import a module on first use and record how long it took.
+
+    Always goes through importlib: it's a cheap dict lookup once the module is loaded, and it
+    waits on the module's own import lock, so a thread never gets a module another thread is
+    still initialising (e.g. transformers while the preload thread imports torch).
+    """
+    loaded = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if not loaded:
+        _import_times.setdefault(name, time.perf_counter() - start)
+    return module
+
+@contextmanager
+def timed_import(name: str):
+    """
+    Time an import block, e.g. the app routers pulled in by main.py.
+    """
+    start = time.perf_counter()
+    yield
+    _import_times.setdefault(name, time.perf_counter() - start)
+
+def mark_ready():
+    global _ready_at
+    if _ready_at is None:
+        _ready_at = time.perf_counter()
+
+def is_ready() -> bool:
+    return _ready_at is not None
+
+def preload_enabled() -> bool:
+    return os.getenv("PRELOAD_MODELS", "false").lower() in ("1", "true", "yes")
+
+def preload_models():
+    """
+    Warm up the embedding model, vector store and LLM client so the first request doesn't pay for it.
+    Runs in a worker thread from the app lifespan when PRELOAD_MODELS is set.
+    """
+    from app.core.rag import get_embeddings, get_vectorstore, get_llm
+
+    _preload_state["status"] = "loading"
+    start = time.perf_counter()
+    try:
+        get_embeddings()
+        get_vectorstore()
+        try:
+            get_llm()
+        except ValueError as e:
+            # No API key configured; search still works, only generation will fail
+            print(f"Skipping LLM preload: {e}")
+        _preload_state["status"] = "done"
+    except Exception as e:
+        _preload_state["status"] = "failed"
+        _preload_state["error"] = str(e)
+        print(f"Model preload failed: {e}")
+    finally:
+        _preload_state["seconds"] = round(time.perf_counter() - start, 3)
+        mark_ready()
+
+def startup_report() -> dict:
+    """
+    Import costs per module (slowest first) plus time-to-ready.
+    """
+    imports = sorted(_import_times.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "ready": is_ready(),
+        "seconds_to_ready": round(_ready_at - _process_start, 3) if _ready_at else None,
+        "preload": {"enabled": preload_enabled(), **_preload_state},
+        "imports": [{"module": name, "seconds": round(seconds, 4)} for name, seconds in imports],
+    }
@@ -0,0 +1,140 @@
+import json
+import time
+from datetime import datetime
+from sqlalchemy import select, delete, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import Document, DocumentProfile, User
+
+def _insert_for(db: AsyncSession):
+    """
+    Returns the dialect-specific insert() so we can use ON CONFLICT upserts.
+    Both SQLite and Postgres support the same on_conflict_* API.
+    """
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+async def upsert_document(db: AsyncSession, filename: str, **fields):
+    """
+    Inserts the document row, or refreshes it if the filename is already catalogued.
+    Single statement, so concurrent uploads of the same file can't race on the unique index.
+    Only the given fields are updated on an existing row; upload_date defaults to now on insert
+    and otherwise changes only when passed explicitly.
+    """
+    values = {"filename": filename, "upload_date": datetime.now().isoformat(), "updated_at": time.time(), **fields}
+    insert = _insert_for(db)
+    stmt = insert(Document).values(**values)
+    if fields:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Document.filename],
+            set_={k: stmt.excluded[k] for k in {*fields, "updated_at"}},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Document.filename])
+    await db.execute(stmt)
+    await db.commit()
+
+async def delete_document(db: AsyncSession, filename: str) -> bool:
+    """
+    Removes the catalog row. Returns False if there was nothing to delete.
+    """
+    # Derived data goes with it
+    await db.execute(delete(DocumentProfile).where(DocumentProfile.filename == filename))
+    result = await db.execute(delete(Document).where(Document.filename == filename))
+    await db.commit()
+    return result.rowcount > 0
+
+async def get_documents_by_filename(db: AsyncSession):
+    result = await db.execute(select(Document))
+    return {doc.filename: doc for doc in result.scalars().all()}
+
+async def list_document_filenames(db: AsyncSession, indexed_only: bool = True):
+    """
+    Catalogued filenames. By default only documents that finished indexing (rows from before
+    statuses were tracked have none); pass indexed_only=False to include in-progress and failed ones.
+    """
+    stmt = select(Document.filename).order_by(Document.id)
+    if indexed_only:
+        stmt = stmt.where(or_(Document.status.is_(None), Document.status == "indexed"))
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+async def list_indexing_filenames(db: AsyncSession, stale_after: float):
+    """
+    Documents marked "indexing", split into (in_progress, stale). A row not written for stale_after
+    seconds (or never timestamped) belongs to an upload that died mid-way and won't finish.
+    """
+    result = await db.execute(
+        select(Document.filename, Document.updated_at).where(Document.status == "indexing").order_by(Document.id)
+    )
+    cutoff = time.time() - stale_after
+    in_progress, stale = [], []
+    for filename, updated_at in result.all():
+        (in_progress if updated_at is not None and updated_at >= cutoff else stale).append(filename)
+    return in_progress, stale
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def list_document_stats(db: AsyncSession):
+    result = await db.execute(select(Document).order_by(Document.id))
+    return [
+        {
+            "filename": doc.filename,
+            "upload_date": doc.upload_date,
+            "chunks": doc.chunk_count,
+            "tokens": doc.token_count,
+        }
+        for doc in result.scalars().all()
+    ]
+
+async def save_profile(db: AsyncSession, filename: str, profile: dict):
+    """
+    Stores (or replaces) a document's embedding profile, or drops it if profile is None.
+    """
+    if profile is None:
+        await db.execute(delete(DocumentProfile).where(DocumentProfile.filename == filename))
+        await db.commit()
+        return
+    values = {
+        "filename": filename,
+        "dim": int(profile["centroid"].shape[0]),
+        "chunk_count": profile["chunk_count"],
+        "centroid": profile["centroid"].astype("float32").tobytes(),
+        "rep_ids": json.dumps(profile["rep_ids"]),
+        "rep_vectors": profile["rep_vectors"].astype("float32").tobytes(),
+        "updated_at": time.time(),
+    }
+    insert = _insert_for(db)
+    stmt = insert(DocumentProfile).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DocumentProfile.filename],
+        set_={k: stmt.excluded[k] for k in values if k != "filename"},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+async def profiles_version(db: AsyncSession):
+    result = await db.execute(select(func.count(DocumentProfile.id), func.max(DocumentProfile.updated_at)))
+    return tuple(result.one())
+
+async def list_centroid_rows(db: AsyncSession):
+    result = await db.execute(
+        select(DocumentProfile.filename, DocumentProfile.centroid).order_by(DocumentProfile.filename)
+    )
+    return result.all()
+
+async def get_profile_rows(db: AsyncSession, filenames: list):
+    result = await db.execute(select(DocumentProfile).where(DocumentProfile.filename.in_(filenames)))
+    return list(result.scalars().all())
+
+async def list_filenames_without_profile(db: AsyncSession):
+    result = await db.execute(
+        select(Document.filename)
+        .outerjoin(DocumentProfile, DocumentProfile.filename == Document.filename)
+        .where(DocumentProfile.id.is_(None))
+    )
+    return list(result.scalars().all())
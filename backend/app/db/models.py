@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Float, LargeBinary, Text
 from app.db.database import Base
 
 class User(Base):
@@ -14,3 +14,24 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, unique=True, index=True)
     upload_date = Column(String) # Storing as string for simplicity, or use DateTime
+    chunk_count = Column(Integer, nullable=True)
+    token_count = Column(Integer, nullable=True)
+    # Ingestion bookkeeping, used by ingest_corpus.py to resume and skip unchanged files
+    status = Column(String, nullable=True)  # "indexing", "indexed" or "failed"
+    content_hash = Column(String, nullable=True)  # sha256 of the PDF bytes
+    file_size = Column(Integer, nullable=True)
+    file_mtime = Column(Float, nullable=True)
+    error = Column(String, nullable=True)
+    updated_at = Column(Float, nullable=True)  # time.time() of the last write, to spot abandoned "indexing" rows
+
+class DocumentProfile(Base):
+    __tablename__ = "document_profiles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, unique=True, index=True)
+    dim = Column(Integer)
+    chunk_count = Column(Integer)
+    centroid = Column(LargeBinary)  # float32 bytes, L2-normalised
+    rep_ids = Column(Text)  # JSON list of Chroma chunk ids
+    rep_vectors = Column(LargeBinary)  # float32 bytes, len(rep_ids) x dim
+    updated_at = Column(Float)  # unix time, lets each process notice its cached matrix is stale
@@ -0,0 +1 @@
+# Lets `pytest` run from backend/ with the `app` package importable, same as uvicorn sees it.
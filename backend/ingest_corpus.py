@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.core.rag import load_and_chunk, replace_document_chunks
+from app.db.database import SessionLocal, engine, init_db
+from app.db import crud
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def prepare_file(path, filename, known_hash):
+    """
+    Runs in a worker process: hash the file and, if it changed, parse and chunk it.
+    Returns (content_hash, chunks, stats); chunks is None when the content is unchanged.
+    """
+    content_hash = file_sha256(path)
+    if content_hash == known_hash:
+        return content_hash, None, None
+    chunks, stats = load_and_chunk(path, filename)
+    return content_hash, chunks, stats
+
+def find_pdfs(root):
+    """
+    Walks root and yields (path, filename) for every PDF.
+    The filename stored in the catalog is the path relative to root, so same-named files in
+    different folders don't collide.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(dirpath, name)
+                yield path, os.path.relpath(path, root).replace(os.sep, "/")
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+async def ingest(root, workers, force=False):
+    await init_db()
+
+    async with SessionLocal() as db:
+        catalog = await crud.get_documents_by_filename(db)
+
+    # Work out what needs doing. Files already indexed with the same size and mtime are
+    # skipped without even being read; anything else gets hashed in a worker.
+    pending = []
+    skipped = 0
+    for path, filename in find_pdfs(root):
+        stat = os.stat(path)
+        doc = catalog.get(filename)
+        if (
+            not force and doc is not None and doc.status == "indexed"
+            and doc.file_size == stat.st_size and doc.file_mtime == stat.st_mtime
+        ):
+            skipped += 1
+            continue
+        known_hash = doc.content_hash if doc is not None and doc.status == "indexed" and not force else None
+        pending.append((path, filename, known_hash, stat))
+
+    total = len(pending)
+    print(f"Found {total + skipped} PDFs under {root}: {skipped} already indexed, {total} to check")
+    if not total:
+        return
+
+    loop = asyncio.get_running_loop()
+    # spawn, not fork: the parent loads torch for embedding and forking after that is unsafe
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    done = 0
+    unchanged = 0
+    failed = 0
+    chunk_total = 0
+    start = time.perf_counter()
+    # Embedding + Chroma writes stay in this process, one file at a time
+    index_lock = asyncio.Lock()
+
+    async def handle(path, filename, stat, future):
+        nonlocal done, unchanged, failed, chunk_total
+        async with SessionLocal() as db:
+            try:
+                content_hash, chunks, stats = await future
+                if chunks is None:
+                    # Touched but identical content, just remember the new mtime
+                    unchanged += 1
+                    await crud.upsert_document(db, filename, file_size=stat.st_size, file_mtime=stat.st_mtime)
+                else:
+                    await crud.upsert_document(db, filename, status="indexing", error=None)
+                    async with index_lock:
+                        profile = await asyncio.to_thread(replace_document_chunks, filename, chunks)
+                    await crud.upsert_document(
+                        db, filename,
+                        status="indexed", error=None, content_hash=content_hash,
+                        upload_date=datetime.now().isoformat(),
+                        file_size=stat.st_size, file_mtime=stat.st_mtime,
+                        chunk_count=stats["chunks"], token_count=stats["tokens"],
+                    )
+                    await crud.save_profile(db, filename, profile)
+                    chunk_total += stats["chunks"]
+            except Exception as e:
+                failed += 1
+                await db.rollback()
+                await crud.upsert_document(db, filename, status="failed", error=str(e))
+                await crud.save_profile(db, filename, None)
+                print(f"Failed {filename}: {e}")
+
+        done += 1
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else 0
+        print(
+            f"[{done}/{total}] {filename} | {rate:.2f} files/s, "
+            f"{chunk_total / elapsed if elapsed else 0:.1f} chunks/s | ETA {format_eta(eta)}"
+        )
+
+    # Keep a bounded number of files in flight so a huge corpus doesn't pile up parsed chunks in memory
+    in_flight = set()
+    limit = workers * 2
+    try:
+        for path, filename, known_hash, stat in pending:
+            future = loop.run_in_executor(pool, prepare_file, path, filename, known_hash)
+            in_flight.add(asyncio.create_task(handle(path, filename, stat, future)))
+            if len(in_flight) >= limit:
+                _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        if in_flight:
+            await asyncio.wait(in_flight)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    indexed = done - unchanged - failed
+    print(
+        f"\nDone in {format_eta(elapsed)}: {indexed} indexed ({chunk_total} chunks), "
+        f"{unchanged} unchanged, {failed} failed, {skipped} skipped"
+    )
+
+async def main(args):
+    try:
+        await ingest(args.root, args.workers, force=args.force)
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-index a directory tree of PDFs. Safe to interrupt and re-run.")
+    parser.add_argument("root", help="Directory to scan recursively for PDFs")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Parallel parse/chunk worker processes (default: CPU count - 1)")
+    parser.add_argument("--force", action="store_true", help="Re-index every file even if unchanged")
+    asyncio.run(main(parser.parse_args()))
@@ -1,10 +1,31 @@
-from fastapi import FastAPI
+from app.core import startup
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+with startup.timed_import("app.db.database"):
+    from app.db.database import engine, init_db
 
-from app.db.database import engine, Base
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables on startup, release pooled connections on shutdown
+    await init_db()
+    preload_task = None
+    if startup.preload_enabled():
+        # Load models in the background; /ready reports 503 until they're warm
+        preload_task = asyncio.create_task(asyncio.to_thread(startup.preload_models))
+    else:
+        startup.mark_ready()
+    yield
+    if preload_task is not None and not preload_task.done():
+        preload_task.cancel()
+    shutdown_hash_pool()
+    await engine.dispose()
 
-app = FastAPI(title="Smart Search & Insights API")
+app = FastAPI(title="Smart Search & Insights API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -15,12 +36,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-from app.api.endpoints import router as api_router
-from app.api.auth import router as auth_router
+with startup.timed_import("app.api.endpoints"):
+    from app.api.endpoints import router as api_router
+with startup.timed_import("app.api.auth"):
+    from app.api.auth import router as auth_router, get_current_user, AUTH_ENABLED
+from app.core.security import shutdown_hash_pool
 
-app.include_router(api_router, prefix="/api")
+api_dependencies = [Depends(get_current_user)] if AUTH_ENABLED else []
+app.include_router(api_router, prefix="/api", dependencies=api_dependencies)
 app.include_router(auth_router, prefix="/auth")
 
 @app.get("/")
 def read_root():
     return {"message": "Smart Search & Insights API is running"}
+
+@app.get("/health")
+def health():
+    # Liveness: the process is up and serving requests
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    # Readiness: models are loaded (or preloading is disabled)
+    if not startup.is_ready():
+        return JSONResponse(status_code=503, content={"status": "loading"})
+    return {"status": "ready"}
+
+@app.get("/startup")
+def startup_report():
+    return startup.startup_report()
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.api import auth
+from app.core import security
+from app.core.cache import TTLCache
+from app.db.database import get_db
+
+def test_auth_refuses_the_default_secret_key():
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        auth.check_auth_config(True, security.DEFAULT_SECRET_KEY)
+    auth.check_auth_config(True, "a-real-secret")
+    auth.check_auth_config(False, security.DEFAULT_SECRET_KEY)
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def rollback(self):
+        pass
+
+class FakeUsers:
+    """
+    Stands in for crud.get_user_by_email and counts the lookups.
+    """
+
+    def __init__(self, **users):
+        self.users = users
+        self.lookups = 0
+
+    async def __call__(self, db, email):
+        self.lookups += 1
+        return self.users.get(email)
+
+@pytest.fixture
+def users(monkeypatch):
+    users = FakeUsers(**{
+        "ann@example.com": SimpleNamespace(id=1, email="ann@example.com", hashed_password="hash"),
+    })
+    monkeypatch.setattr(auth.crud, "get_user_by_email", users)
+    monkeypatch.setattr(auth, "SessionLocal", FakeSession)
+    monkeypatch.setattr(auth, "_claims_cache", TTLCache(maxsize=100, ttl=300))
+    monkeypatch.setattr(auth, "_user_cache", TTLCache(maxsize=100, ttl=300))
+    monkeypatch.setattr(auth, "auth_rate_limiter", security.RateLimiter(2))
+    return users
+
+@pytest.fixture
+def client(users):
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/auth")
+    app.dependency_overrides[get_db] = FakeSession
+    return TestClient(app)
+
+def login(client, username, password="wrong"):
+    return client.post("/auth/token", data={"username": username, "password": password})
+
+def test_login_attempts_are_limited_per_account(client, monkeypatch):
+    async def verify(plain, hashed):
+        return False
+    monkeypatch.setattr(auth, "verify_password_async", verify)
+
+    assert [login(client, "ann@example.com").status_code for _ in range(3)] == [401, 401, 429]
+    # Same client address, different account: not affected
+    assert login(client, "bob@example.com").status_code == 401
+    # Case and padding don't buy extra attempts
+    assert login(client, " ANN@example.com").status_code == 429
+
+def current_user(token):
+    return asyncio.run(auth.get_current_user(token))
+
+def test_repeat_requests_hit_the_caches(users):
+    token = security.create_access_token({"sub": "ann@example.com"})
+
+    assert current_user(token).id == 1
+    assert current_user(token).email == "ann@example.com"
+    assert users.lookups == 1
+    assert auth._claims_cache.get(token)["sub"] == "ann@example.com"
+
+def test_cached_claims_expire_with_the_token(users, monkeypatch):
+    token = security.create_access_token({"sub": "ann@example.com"}, expires_delta=timedelta(minutes=5))
+    current_user(token)
+    exp = auth._claims_cache.get(token)["exp"]
+
+    monkeypatch.setattr(auth.time, "time", lambda: exp + 1)
+    with pytest.raises(HTTPException) as err:
+        current_user(token)
+    assert err.value.status_code == 401
+    assert auth._claims_cache.get(token) is None
+
+@pytest.mark.parametrize("token", [
+    None,
+    "not-a-jwt",
+    jwt.encode({"sub": "ann@example.com", "exp": 4102444800}, "some-other-key", algorithm=security.ALGORITHM),
+    security.create_access_token({"sub": "ann@example.com"}, expires_delta=timedelta(minutes=-1)),
+    security.create_access_token({"role": "admin"}),
+    security.create_access_token({"sub": "nobody@example.com"}),
+])
+def test_invalid_tokens_get_401(users, token):
+    with pytest.raises(HTTPException) as err:
+        current_user(token)
+    assert err.value.status_code == 401
+
+def test_me_requires_a_valid_token(client):
+    assert client.get("/auth/me").status_code == 401
+    token = security.create_access_token({"sub": "ann@example.com"})
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.json() == {"id": 1, "email": "ann@example.com"}
+
+def test_busy_hash_pool_returns_503(client, monkeypatch):
+    async def busy(*args):
+        raise security.PasswordHashBusy()
+    monkeypatch.setattr(auth, "verify_password_async", busy)
+    monkeypatch.setattr(auth, "get_password_hash_async", busy)
+
+    assert login(client, "ann@example.com").status_code == 503
+    response = client.post("/auth/register", json={"email": "new@example.com", "password": "pw"})
+    assert response.status_code == 503
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(security.time, "monotonic", lambda: now[0])
+    limiter = security.RateLimiter(rate=2, per=60)
+
+    assert [limiter.allow("k") for _ in range(3)] == [True, True, False]
+    now[0] += 30
+    assert limiter.allow("k") is True
+    assert limiter.allow("k") is False
@@ -0,0 +1,89 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+from langchain_core.documents import Document
+
+from app.core import chunking
+
+CHUNK_TOKENS = 250
+
+@pytest.fixture(autouse=True)
+def word_token_counter(monkeypatch):
+    # Whitespace "tokens" keep the tests offline and deterministic
+    monkeypatch.setattr(chunking, "_tokenizer", lambda text: len(text.split()))
+
+def make_page(rng, n_tokens):
+    words = "the quick brown fox jumps over lazy dog data model search index".split()
+    sentences = []
+    total = 0
+    while total < n_tokens:
+        length = rng.randint(8, 20)
+        sentences.append(" ".join(rng.choices(words, k=length)).capitalize() + ".")
+        total += length
+    return " ".join(sentences)
+
+def make_pages(n_pages, n_tokens, seed=0):
+    rng = random.Random(seed)
+    return [Document(page_content=make_page(rng, n_tokens), metadata={"page": i}) for i in range(n_pages)]
+
+def test_pages_larger_than_chunk_merge_across_boundaries():
+    pages = make_pages(5, 600)
+    chunks, stats = chunking.chunk_pages(pages, "doc.pdf", chunk_tokens=CHUNK_TOKENS, overlap=0)
+
+    assert stats["cross_page_chunks"] > 0
+    # Only the document's final chunk may be short; no per-page tails
+    assert all(c.metadata["tokens"] >= CHUNK_TOKENS * 0.8 for c in chunks[:-1])
+    assert stats["chunks"] == len(chunks)
+    assert stats["max_tokens"] <= CHUNK_TOKENS
+
+def test_page_span_metadata():
+    pages = make_pages(5, 600)
+    chunks, _ = chunking.chunk_pages(pages, "doc.pdf", chunk_tokens=CHUNK_TOKENS, overlap=0)
+
+    assert chunks[0].metadata["page"] == 0
+    assert chunks[-1].metadata["page_end"] == 4
+    for prev, chunk in zip(chunks, chunks[1:]):
+        assert chunk.metadata["page"] >= prev.metadata["page"]
+        assert chunk.metadata["page_end"] >= chunk.metadata["page"]
+        assert chunk.metadata["source"] == "doc.pdf"
+
+def test_adaptive_overlap_is_about_one_sentence_and_capped():
+    text = make_page(random.Random(1), 2000)
+    overlap = chunking.adaptive_overlap(text, CHUNK_TOKENS, chunking._tokenizer)
+    assert 8 <= overlap <= 21
+
+    long_sentences = ". ".join(["word " * 200] * 5)
+    assert chunking.adaptive_overlap(long_sentences, CHUNK_TOKENS, chunking._tokenizer) == int(CHUNK_TOKENS * 0.2)
+
+def test_invalid_overlap_rejected():
+    with pytest.raises(ValueError):
+        chunking.resolve_overlap(CHUNK_TOKENS, "text", CHUNK_TOKENS, chunking._tokenizer)
+
+def test_empty_pages_produce_no_chunks():
+    chunks, stats = chunking.chunk_pages([Document(page_content="   ")], "doc.pdf")
+    assert chunks == []
+    assert stats["chunks"] == 0
+
+def test_tokenizer_load_failure_is_loud_and_retried(monkeypatch):
+    monkeypatch.setattr(chunking, "_tokenizer", None)
+    attempts = []
+
+    class AutoTokenizer:
+        @staticmethod
+        def from_pretrained(name):
+            attempts.append(name)
+            if len(attempts) == 1:
+                raise OSError("connection reset")
+            return SimpleNamespace(encode=lambda text, add_special_tokens: text.split())
+
+    monkeypatch.setattr(chunking, "lazy_import", lambda name: SimpleNamespace(AutoTokenizer=AutoTokenizer))
+
+    with pytest.raises(RuntimeError, match="tokenizer"):
+        chunking.get_token_counter()
+    assert chunking._tokenizer is None
+
+    assert chunking.get_token_counter()("three word text") == 3
+    assert len(attempts) == 2
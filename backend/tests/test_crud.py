@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.db.database import Base
+from app.db import crud
+from app.db.models import Document
+
+def run(coro_fn):
+    """
+    Runs coro_fn(db) against a fresh in-memory SQLite catalog.
+    """
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                return await coro_fn(db)
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+async def get_doc(db, filename):
+    result = await db.execute(select(Document).where(Document.filename == filename))
+    return result.scalars().one()
+
+def test_listing_hides_pending_and_failed_documents():
+    async def scenario(db):
+        db.add(Document(filename="legacy.pdf"))
+        await db.commit()
+        await crud.upsert_document(db, "done.pdf", status="indexed")
+        await crud.upsert_document(db, "busy.pdf", status="indexing")
+        await crud.upsert_document(db, "broken.pdf", status="failed", error="bad xref")
+        return (
+            await crud.list_document_filenames(db),
+            await crud.list_document_filenames(db, indexed_only=False),
+        )
+
+    listed, everything = run(scenario)
+    assert listed == ["legacy.pdf", "done.pdf"]
+    assert everything == ["legacy.pdf", "done.pdf", "busy.pdf", "broken.pdf"]
+
+def test_upsert_keeps_upload_date_unless_given():
+    async def scenario(db):
+        await crud.upsert_document(db, "a.pdf", status="indexed", upload_date="2024-01-01T00:00:00")
+        await crud.upsert_document(db, "a.pdf", file_size=10, file_mtime=1.5)
+        touched = await get_doc(db, "a.pdf")
+        touched = (touched.upload_date, touched.status, touched.file_size)
+
+        await crud.upsert_document(db, "a.pdf")
+        await crud.upsert_document(db, "a.pdf", upload_date="2025-01-01T00:00:00")
+        db.expire_all()
+        return touched, (await get_doc(db, "a.pdf")).upload_date
+
+    touched, reindexed_date = run(scenario)
+    assert touched == ("2024-01-01T00:00:00", "indexed", 10)
+    assert reindexed_date == "2025-01-01T00:00:00"
+
+def test_upsert_sets_upload_date_on_insert():
+    async def scenario(db):
+        await crud.upsert_document(db, "new.pdf", status="indexing")
+        return (await get_doc(db, "new.pdf")).upload_date
+
+    assert run(scenario)
+
+def test_abandoned_indexing_rows_go_stale():
+    async def scenario(db):
+        await crud.upsert_document(db, "busy.pdf", status="indexing")
+        await crud.upsert_document(db, "crashed.pdf", status="indexing")
+        await crud.upsert_document(db, "done.pdf", status="indexed")
+        crashed = await get_doc(db, "crashed.pdf")
+        crashed.updated_at = time.time() - 7200
+        db.add(Document(filename="legacy.pdf", status="indexing"))
+        await db.commit()
+        return await crud.list_indexing_filenames(db, stale_after=3600)
+
+    assert run(scenario) == (["busy.pdf"], ["crashed.pdf", "legacy.pdf"])
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.db import database, crud
+from app.db.models import Document
+
+@pytest.mark.parametrize("url, expected", [
+    (None, database.DEFAULT_DATABASE_URL),
+    ("sqlite:///./other.db", "sqlite+aiosqlite:///./other.db"),
+    ("postgres://u:p@db:5432/app", "postgresql+asyncpg://u:p@db:5432/app"),
+    ("postgresql://u:p@db:5432/app", "postgresql+asyncpg://u:p@db:5432/app"),
+    ("postgresql+asyncpg://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+])
+def test_database_url_uses_async_drivers(monkeypatch, url, expected):
+    if url is None:
+        monkeypatch.delenv("DATABASE_URL", raising=False)
+    else:
+        monkeypatch.setenv("DATABASE_URL", url)
+    assert database.get_database_url() == expected
+
+def sqlite_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    event.listen(engine.sync_engine, "connect", database._set_sqlite_pragmas)
+    return engine
+
+def test_sqlite_connections_get_the_pragmas(tmp_path):
+    async def main():
+        engine = sqlite_engine(tmp_path)
+        try:
+            async with engine.connect() as conn:
+                return {
+                    name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                    for name in ("journal_mode", "synchronous", "busy_timeout", "foreign_keys")
+                }
+        finally:
+            await engine.dispose()
+
+    # synchronous NORMAL reads back as 1
+    assert asyncio.run(main()) == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "foreign_keys": 1}
+
+def test_missing_columns_are_added_to_old_tables(tmp_path):
+    async def main():
+        engine = sqlite_engine(tmp_path)
+        try:
+            async with engine.begin() as conn:
+                # The documents table as the first release created it
+                await conn.execute(text(
+                    "CREATE TABLE documents (id INTEGER PRIMARY KEY, filename VARCHAR UNIQUE, upload_date VARCHAR)"
+                ))
+                await conn.run_sync(database.Base.metadata.create_all)
+                await conn.run_sync(database._add_missing_columns)
+                rows = await conn.execute(text("PRAGMA table_info(documents)"))
+                return {row[1] for row in rows}
+        finally:
+            await engine.dispose()
+
+    assert {"status", "content_hash", "file_mtime", "updated_at"} <= asyncio.run(main())
+
+def test_concurrent_first_uploads_of_one_file_make_one_row(tmp_path):
+    async def main():
+        engine = sqlite_engine(tmp_path)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(database.Base.metadata.create_all)
+            sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+            async def upload(chunks):
+                async with sessions() as db:
+                    await crud.upsert_document(db, "same.pdf", status="indexed", chunk_count=chunks)
+
+            await asyncio.gather(*(upload(n) for n in range(1, 6)))
+            async with sessions() as db:
+                return (await db.execute(select(Document))).scalars().all()
+        finally:
+            await engine.dispose()
+
+    rows = asyncio.run(main())
+    assert len(rows) == 1
+    assert rows[0].chunk_count in range(1, 6)
@@ -0,0 +1,144 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import maintenance
+
+class FakeCollection:
+    def __init__(self, chunks):
+        # {chunk_id: source}
+        self.chunks = dict(chunks)
+
+    def get(self, include=None, limit=None, offset=0):
+        ids = list(self.chunks)[offset:offset + limit]
+        return {"ids": ids, "metadatas": [{"source": self.chunks[i]} for i in ids]}
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.chunks.pop(chunk_id, None)
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection({
+        "kept.pdf::0": "kept.pdf",
+        "gone.pdf::0": "gone.pdf",
+        "gone.pdf::1": "gone.pdf",
+        "uploading.pdf::0": "uploading.pdf",
+    })
+    monkeypatch.setattr(maintenance, "get_vectorstore", lambda: SimpleNamespace(_collection=collection))
+    monkeypatch.setattr(maintenance, "index_size_bytes", lambda *args: 0)
+    collection.compactions = []
+    monkeypatch.setattr(maintenance, "compact_index", lambda rebuild=False: collection.compactions.append(rebuild))
+    return collection
+
+def test_cleanup_skips_documents_being_indexed(collection):
+    report = maintenance.cleanup_index(["kept.pdf", "empty.pdf"], indexing=["uploading.pdf"])
+
+    assert report["orphaned_sources"] == ["gone.pdf"]
+    assert report["orphaned_chunks"] == 2
+    assert report["documents_without_chunks"] == ["empty.pdf"]
+    assert report["skipped_indexing"] == ["uploading.pdf"]
+    assert set(collection.chunks) == {"kept.pdf::0", "uploading.pdf::0"}
+
+def test_rebuild_is_opt_in_and_only_after_deletes(collection):
+    maintenance.cleanup_index(["kept.pdf", "gone.pdf", "uploading.pdf"], rebuild=True)
+    maintenance.cleanup_index(["kept.pdf", "uploading.pdf"])
+    maintenance.cleanup_index(["kept.pdf"], rebuild=True, indexing=["uploading.pdf"])
+    assert collection.compactions == [False, False, False]
+
+    collection.chunks["gone.pdf::0"] = "gone.pdf"
+    report = maintenance.cleanup_index(["kept.pdf", "uploading.pdf"], rebuild=True)
+    assert report["rebuilt"] is True
+    assert collection.compactions[-1] is True
+
+def test_cleanup_dry_run_changes_nothing(collection):
+    report = maintenance.cleanup_index(["kept.pdf"], dry_run=True)
+
+    assert report["orphaned_chunks"] == 3
+    assert report["chunks_remaining"] == 4
+    assert len(collection.chunks) == 4
+
+def lock_is_free():
+    """
+    Whether another thread could take the index write lock right now.
+    """
+    result = []
+    def probe():
+        acquired = maintenance.index_write_lock.acquire(blocking=False)
+        if acquired:
+            maintenance.index_write_lock.release()
+        result.append(acquired)
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    return result[0]
+
+class FakeClient:
+    def __init__(self, collections):
+        self.collections = collections
+
+    def delete_collection(self, name):
+        if name not in self.collections:
+            raise ValueError(name)
+        del self.collections[name]
+
+    def create_collection(self, name, metadata=None, embedding_function=None):
+        collection = StoredCollection(self, name, metadata)
+        self.collections[name] = collection
+        return collection
+
+class StoredCollection:
+    def __init__(self, client, name, metadata=None):
+        self.client, self.name, self.metadata = client, name, metadata
+        self.rows = {}
+
+    def get(self, include=None, limit=None, offset=0):
+        ids = list(self.rows)[offset:offset + limit]
+        return {
+            "ids": ids,
+            "embeddings": [self.rows[i][0] for i in ids],
+            "documents": [self.rows[i][1] for i in ids],
+            "metadatas": [self.rows[i][2] for i in ids],
+        }
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.adds_while_unlocked = getattr(self, "adds_while_unlocked", 0) + lock_is_free()
+        self.rows.update(zip(ids, zip(embeddings, documents, metadatas)))
+
+    def count(self):
+        return len(self.rows)
+
+    def modify(self, name):
+        del self.client.collections[self.name]
+        self.name = name
+        self.client.collections[name] = self
+
+def test_rebuild_swaps_in_a_copy_of_the_live_vectors(monkeypatch):
+    client = FakeClient({})
+    old = client.create_collection(maintenance.COLLECTION_NAME, metadata={"hnsw:space": "cosine"})
+    for i in range(7):
+        old.add([f"a.pdf::{i}"], [[float(i)]], [f"text {i}"], [{"source": "a.pdf"}])
+    resets = []
+    monkeypatch.setattr(maintenance, "get_vectorstore", lambda: SimpleNamespace(_client=client, _collection=old))
+    monkeypatch.setattr(maintenance, "reset_vectorstore", lambda: resets.append(True))
+    monkeypatch.setattr(maintenance, "SCAN_BATCH_SIZE", 3)
+
+    assert maintenance.rebuild_collection() == 7
+
+    assert list(client.collections) == [maintenance.COLLECTION_NAME]
+    rebuilt = client.collections[maintenance.COLLECTION_NAME]
+    assert rebuilt is not old
+    assert rebuilt.rows == old.rows
+    assert rebuilt.metadata == {"hnsw:space": "cosine"}
+    assert resets == [True]
+    # Uploads in this process are held off for the whole copy
+    assert rebuilt.adds_while_unlocked == 0
+
+def test_index_size_splits_sqlite_and_hnsw(tmp_path):
+    (tmp_path / maintenance.SQLITE_FILE).write_bytes(b"x" * 10)
+    segment = tmp_path / "3f6c1d2e-segment"
+    segment.mkdir()
+    (segment / "data_level0.bin").write_bytes(b"x" * 25)
+
+    assert maintenance.index_size_bytes(str(tmp_path)) == {"sqlite": 10, "hnsw": 25}
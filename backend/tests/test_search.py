@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app.core import rag
+from app.core.similarity import mmr_order
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1, 0, 0], dtype=np.float32)
+    vectors = np.array([
+        [0.9, 0.1, 0],
+        [0.9, 0.11, 0],   # near-copy of 0
+        [0.7, 0, 0.7],
+    ], dtype=np.float32)
+
+    assert mmr_order(query, vectors, lambda_mult=0.5) == [0, 2, 1]
+    assert mmr_order(query, vectors, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr_order(query, vectors, k=1) == [0]
+    assert mmr_order(query, np.zeros((0, 3))) == []
+
+def test_cursor_round_trip():
+    assert rag._decode_cursor(rag._encode_cursor("abc123", 15)) == ("abc123", 15)
+    with pytest.raises(ValueError):
+        rag._decode_cursor("not a cursor")
+
+class FakeCollection:
+    def __init__(self, rows):
+        # [(chunk_id, text, score)], returned best score first
+        self.rows = {chunk_id: (text, score) for chunk_id, text, score in rows}
+        self.queries = 0
+        self.n_results = []
+
+    def query(self, query_embeddings, n_results, where, include):
+        self.queries += 1
+        self.n_results.append(n_results)
+        ranked = sorted(self.rows, key=lambda i: -self.rows[i][1])[:n_results]
+        return {
+            "ids": [ranked],
+            "documents": [[self.rows[i][0] for i in ranked]],
+            "metadatas": [[{"source": i.split("::")[0]} for i in ranked]],
+        }
+
+    def get(self, ids=None, where=None, include=None):
+        if where is not None:
+            ids = [i for i in self.rows if i.split("::")[0] == where["source"]]
+        found = [i for i in ids if i in self.rows]
+        return {
+            "ids": found,
+            "documents": [self.rows[i][0] for i in found],
+            "metadatas": [{"source": i.split("::")[0]} for i in found],
+        }
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.rows.pop(chunk_id, None)
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection([(f"a.pdf::{i}", f"text {i}", 10 - i) for i in range(7)])
+    monkeypatch.setattr(rag, "get_vectorstore", lambda: SimpleNamespace(_collection=collection))
+    monkeypatch.setattr(rag, "get_embeddings", lambda: SimpleNamespace(embed_query=lambda q: [1.0]))
+    rag._search_cache.clear()
+    return collection
+
+def texts(docs):
+    return [doc.page_content for doc in docs]
+
+def test_pages_follow_the_cached_ranking(collection):
+    page, cursor = rag.query_page("q", k=3)
+    assert texts(page) == ["text 0", "text 1", "text 2"]
+
+    page, cursor = rag.query_page("q", k=3, cursor=cursor)
+    assert texts(page) == ["text 3", "text 4", "text 5"]
+
+    page, cursor = rag.query_page("q", k=3, cursor=cursor)
+    assert texts(page) == ["text 6"]
+    assert cursor is None
+    assert collection.queries == 1
+
+def test_later_pages_never_serve_stale_chunks(collection):
+    _, cursor = rag.query_page("q", k=3)
+
+    # Re-indexed and removed behind the server's back (e.g. by the ingest CLI)
+    collection.rows["a.pdf::3"] = ("text 3 v2", 7)
+    del collection.rows["a.pdf::4"]
+
+    page, _ = rag.query_page("q", k=3, cursor=cursor)
+    assert texts(page) == ["text 3 v2", "text 5"]
+
+def test_deleting_a_document_drops_cached_searches(collection):
+    _, cursor = rag.query_page("q", k=3)
+    rag.delete_document_chunks("a.pdf")
+
+    page, cursor = rag.query_page("q", k=3, cursor=cursor)
+    assert page == [] and cursor is None
+    assert collection.queries == 2
+
+def test_forged_cursor_cannot_widen_the_search(collection):
+    forged = rag._encode_cursor("expired", 100_000_000)
+    with pytest.raises(ValueError):
+        rag.query_page("q", k=3, cursor=forged, mmr=True, fetch_k=5)
+    assert collection.queries == 0
+
+    # An expired but genuine cursor re-runs the search over fetch_k candidates only
+    page, _ = rag.query_page("q", k=3, cursor=rag._encode_cursor("expired", 3), fetch_k=5)
+    assert texts(page) == ["text 3", "text 4"]
+    assert collection.n_results == [5]
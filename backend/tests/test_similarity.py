@@ -0,0 +1,176 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import endpoints
+from app.core import similarity
+from app.db.database import get_db
+
+def unit(rng, n, dim=16):
+    return similarity.normalize(rng.normal(size=(n, dim)).astype(np.float32))
+
+def test_build_profile_picks_distinct_representatives():
+    rng = np.random.default_rng(0)
+    # Two tight clusters: the representatives must come from both
+    base = unit(rng, 2)
+    vectors = np.vstack([base[0] + 0.01 * rng.normal(size=(10, 16)), base[1] + 0.01 * rng.normal(size=(10, 16))])
+    ids = [f"doc::{i}" for i in range(20)]
+
+    profile = similarity.build_profile(ids, vectors, n_representatives=2)
+
+    assert profile["chunk_count"] == 20
+    assert np.isclose(np.linalg.norm(profile["centroid"]), 1.0)
+    picked = sorted(int(chunk_id.split("::")[1]) // 10 for chunk_id in profile["rep_ids"])
+    assert picked == [0, 1]
+
+def test_build_profile_with_fewer_chunks_than_representatives():
+    rng = np.random.default_rng(1)
+    profile = similarity.build_profile(["a::0", "a::1"], unit(rng, 2))
+    assert sorted(profile["rep_ids"]) == ["a::0", "a::1"]
+
+def test_most_similar_excludes_self_and_ranks_by_score():
+    centroids = similarity.normalize(np.array([[1, 0], [0.9, 0.1], [0, 1], [0.5, 0.5]], dtype=np.float32))
+    names = ["a", "b", "c", "d"]
+
+    result = similarity.most_similar(names, centroids, "a", k=2)
+
+    assert [r["filename"] for r in result] == ["b", "d"]
+    assert similarity.most_similar(["a"], centroids[:1], "a") == []
+
+def test_divergent_sections_prefers_unshared_chunks():
+    shared = np.array([1, 0, 0], dtype=np.float32)
+    profiles = {
+        "a.pdf": {"rep_ids": ["a::shared", "a::own"], "rep_vectors": np.array([shared, [0, 1, 0]], dtype=np.float32)},
+        "b.pdf": {"rep_ids": ["b::shared", "b::own"], "rep_vectors": np.array([shared, [0, 0, 1]], dtype=np.float32)},
+    }
+
+    sections = similarity.divergent_sections(profiles, per_document=1)
+
+    assert sections == {"a.pdf": ["a::own"], "b.pdf": ["b::own"]}
+
+def test_profile_round_trips_through_row():
+    rng = np.random.default_rng(2)
+    profile = similarity.build_profile([f"d::{i}" for i in range(5)], unit(rng, 5), n_representatives=3)
+    row = SimpleNamespace(
+        centroid=profile["centroid"].astype("float32").tobytes(),
+        rep_ids='["%s"]' % '", "'.join(profile["rep_ids"]),
+        rep_vectors=profile["rep_vectors"].astype("float32").tobytes(),
+        dim=16,
+        chunk_count=5,
+    )
+
+    restored = similarity.profile_from_row(row)
+
+    assert restored["rep_ids"] == profile["rep_ids"]
+    assert np.allclose(restored["centroid"], profile["centroid"])
+    assert np.allclose(restored["rep_vectors"], profile["rep_vectors"])
+
+@pytest.fixture
+def client(monkeypatch):
+    index = similarity.CentroidIndex()
+    n = similarity.MAX_MATRIX_DOCUMENTS + 1
+    index.filenames = [f"doc{i}.pdf" for i in range(n)]
+    index.centroids = unit(np.random.default_rng(3), n)
+
+    async def centroid_index(db):
+        return index
+
+    monkeypatch.setattr(endpoints, "_centroid_index", centroid_index)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    app.dependency_overrides[get_db] = lambda: None
+    return TestClient(app)
+
+def test_similarity_matrix_is_capped(client):
+    response = client.get("/similarity")
+    assert response.status_code == 400
+
+    response = client.get("/similarity", params={"files": "doc0.pdf,doc1.pdf,doc2.pdf"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["documents"] == ["doc0.pdf", "doc1.pdf", "doc2.pdf"]
+    assert np.allclose(np.diag(body["matrix"]), 1.0, atol=1e-3)
+
+def test_compare_multi_runs_off_the_event_loop(monkeypatch):
+    import asyncio
+    from app.db import crud
+
+    calls = []
+
+    def compare_many(profiles, sections_per_document):
+        try:
+            asyncio.get_running_loop()
+            on_loop = True
+        except RuntimeError:
+            on_loop = False
+        calls.append((on_loop, list(profiles), sections_per_document))
+        return {"documents": list(profiles)}
+
+    async def get_profile_rows(db, files):
+        rng = np.random.default_rng(4)
+        rows = []
+        for f in files:
+            profile = similarity.build_profile([f"{f}::0", f"{f}::1"], unit(rng, 2))
+            rows.append(SimpleNamespace(
+                filename=f, dim=16, chunk_count=2,
+                centroid=profile["centroid"].tobytes(),
+                rep_ids='["%s::0", "%s::1"]' % (f, f),
+                rep_vectors=profile["rep_vectors"].tobytes(),
+            ))
+        return rows
+
+    monkeypatch.setattr(endpoints, "compare_many", compare_many)
+    monkeypatch.setattr(crud, "get_profile_rows", get_profile_rows)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    app.dependency_overrides[get_db] = lambda: None
+
+    with TestClient(app) as client:
+        response = client.post("/compare/multi", json=["a.pdf", "b.pdf"])
+
+    assert response.status_code == 200
+    assert response.json() == {"documents": ["a.pdf", "b.pdf"]}
+    (on_loop, files, per_document), = calls
+    assert files == ["a.pdf", "b.pdf"] and per_document == 3
+    assert not on_loop
+
+def test_compare_multi_needs_two_distinct_files():
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    app.dependency_overrides[get_db] = lambda: None
+
+    response = TestClient(app).post("/compare/multi", json=["a.pdf", "a.pdf"])
+    assert response.status_code == 400
+
+def test_failed_upload_drops_the_stale_profile(monkeypatch):
+    from app.db import crud
+
+    calls = []
+
+    async def process_pdf(file):
+        raise RuntimeError("embedding failed")
+
+    async def upsert_document(db, filename, **fields):
+        calls.append(("upsert", filename, fields.get("status")))
+
+    async def save_profile(db, filename, profile):
+        calls.append(("profile", filename, profile))
+
+    class Session:
+        async def rollback(self):
+            pass
+
+    monkeypatch.setattr(endpoints, "process_pdf", process_pdf)
+    monkeypatch.setattr(crud, "upsert_document", upsert_document)
+    monkeypatch.setattr(crud, "save_profile", save_profile)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    app.dependency_overrides[get_db] = lambda: Session()
+
+    response = TestClient(app).post("/upload", files={"file": ("a.pdf", b"%PDF-1.4", "application/pdf")})
+
+    assert response.status_code == 500
+    assert calls == [("upsert", "a.pdf", "indexing"), ("upsert", "a.pdf", "failed"), ("profile", "a.pdf", None)]
@@ -0,0 +1,69 @@
+import sys
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import startup
+
+def test_lazy_import_waits_for_a_module_still_initialising(tmp_path, monkeypatch):
+    (tmp_path / "slow_module_for_test.py").write_text(
+        "import time\n"
+        "STARTED = True\n"
+        "time.sleep(0.3)\n"
+        "READY = True\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "slow_module_for_test", raising=False)
+
+    loader = threading.Thread(target=startup.lazy_import, args=("slow_module_for_test",))
+    loader.start()
+    # Wait until the other thread has the half-built module in sys.modules
+    while "slow_module_for_test" not in sys.modules:
+        time.sleep(0.005)
+
+    ready = getattr(startup.lazy_import("slow_module_for_test"), "READY", False)
+    loader.join()
+
+    assert ready
+    assert "slow_module_for_test" in dict(startup._import_times)
+
+@pytest.fixture
+def client(monkeypatch):
+    import main
+    monkeypatch.setattr(startup, "_ready_at", None)
+    monkeypatch.setattr(startup, "_preload_state", {"status": "idle", "error": None, "seconds": None})
+    # No context manager, so the lifespan (database, preload) doesn't run
+    return TestClient(main.app)
+
+def test_ready_reports_503_until_models_are_loaded(client):
+    assert client.get("/health").status_code == 200
+    assert client.get("/ready").status_code == 503
+    assert client.get("/startup").json()["ready"] is False
+
+    startup.mark_ready()
+
+    assert client.get("/ready").json() == {"status": "ready"}
+    report = client.get("/startup").json()
+    assert report["ready"] is True
+    assert report["seconds_to_ready"] >= 0
+
+def test_startup_report_lists_slowest_imports_first(client, monkeypatch):
+    monkeypatch.setattr(startup, "_import_times", {"fast": 0.01, "slow": 2.5, "medium": 0.3})
+    imports = client.get("/startup").json()["imports"]
+    assert [item["module"] for item in imports] == ["slow", "medium", "fast"]
+
+def test_preload_marks_ready_even_when_it_fails(client, monkeypatch):
+    from app.core import rag
+
+    def broken():
+        raise OSError("model download failed")
+
+    monkeypatch.setattr(rag, "get_embeddings", broken)
+    startup.preload_models()
+
+    assert client.get("/ready").status_code == 200
+    preload = client.get("/startup").json()["preload"]
+    assert preload["status"] == "failed"
+    assert "model download failed" in preload["error"]
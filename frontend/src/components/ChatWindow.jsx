@@ -66,7 +66,10 @@ const ChatWindow = () => {
             const assistantMessage = {
                 role: 'assistant',
                 content: assistantContent,
-                citations: results
+                citations: results,
+                query: input,
+                fileQuery,
+                nextCursor: response.data.next_cursor
             };
 
             setMessages(prev => [...prev, assistantMessage]);
@@ -77,6 +80,22 @@ const ChatWindow = () => {
         }
     };
 
+    const handleLoadMore = async (idx) => {
+        const msg = messages[idx];
+        if (!msg.nextCursor) return;
+
+        try {
+            // Next page of the same search; the backend serves it from cache without a new LLM call
+            const response = await axios.get(`${import.meta.env.VITE_API_URL}/api/query?q=${encodeURIComponent(msg.query)}${msg.fileQuery}&cursor=${encodeURIComponent(msg.nextCursor)}`);
+            setMessages(prev => prev.map((m, i) => i === idx
+                ? { ...m, citations: [...m.citations, ...response.data.results], nextCursor: response.data.next_cursor }
+                : m
+            ));
+        } catch (error) {
+            console.error("Error loading more sources:", error);
+        }
+    };
+
     return (
         <div className="flex flex-col h-[calc(100vh-8rem)] bg-white rounded-2xl shadow-sm border border-gray-200 overflow-hidden">
             {/* Document Selection Header */}
@@ -142,6 +161,14 @@ const ChatWindow = () => {
                                             <span>{cit.source} (p. {cit.page})</span>
                                         </div>
                                     ))}
+                                    {msg.nextCursor && (
+                                        <button
+                                            onClick={() => handleLoadMore(idx)}
+                                            className="text-xs text-blue-600 hover:text-blue-700 px-2 py-1"
+                                        >
+                                            More sources
+                                        </button>
+                                    )}
                                 </div>
                             )}
                         </div>
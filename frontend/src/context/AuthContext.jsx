@@ -63,6 +63,20 @@ export const AuthProvider = ({ children }) => {
         delete axios.defaults.headers.common['Authorization'];
     };
 
+    useEffect(() => {
+        // When the backend requires auth, an expired token comes back as 401: send the user to log in again
+        const interceptor = axios.interceptors.response.use(
+            response => response,
+            error => {
+                if (error.response?.status === 401 && !error.config?.url?.includes('/auth/')) {
+                    logout();
+                }
+                return Promise.reject(error);
+            }
+        );
+        return () => axios.interceptors.response.eject(interceptor);
+    }, []);
+
     return (
         <AuthContext.Provider value={{ user, login, register, logout, loading }}>
             {children}